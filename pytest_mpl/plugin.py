@@ -32,6 +32,8 @@ import io
 import os
 import json
 import shutil
+import struct
+import filecmp
 import hashlib
 import inspect
 import tempfile
@@ -49,6 +51,8 @@ SHAPE_MISMATCH_ERROR = """Error: Image dimensions did not match.
   Actual shape: {actual_shape}
     {actual_path}"""
 
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
 HTML_INTRO = """
 <!DOCTYPE html>
 <html>
@@ -103,6 +107,22 @@ def _hash_file(in_stream):
     return hasher.hexdigest()
 
 
+def _image_shape(filename):
+    """
+    Return the (height, width) of an image.
+
+    For PNG files the size is read from the header, so that the image does
+    not need to be decoded just to check its dimensions.
+    """
+    with open(str(filename), 'rb') as f:
+        header = f.read(24)
+    if header[:8] == PNG_SIGNATURE and header[12:16] == b'IHDR':
+        width, height = struct.unpack('>II', header[16:24])
+        return height, width
+    from matplotlib.image import imread
+    return imread(str(filename)).shape[:2]
+
+
 def pathify(path):
     """
     Remove non-path safe characters.
@@ -295,6 +315,9 @@ class ImageComparison:
         self._generated_hash_library = {}
         self._test_results = {}
 
+        # Hash libraries are only read during the run, so only load each once
+        self._hash_libraries = {}
+
     def get_compare(self, item):
         """
         Return the mpl_image_compare marker for the given item.
@@ -424,7 +447,6 @@ class ImageComparison:
         """
         Compare a test image to a baseline image.
         """
-        from matplotlib.image import imread
         from matplotlib.testing.compare import compare_images
 
         compare = self.get_compare(item)
@@ -448,11 +470,15 @@ class ImageComparison:
         baseline_image = (result_dir / "baseline.png").absolute()
         shutil.copyfile(baseline_image_ref, baseline_image)
 
+        # Identical files need no decoding or pixel comparison
+        if filecmp.cmp(str(baseline_image), str(test_image), shallow=False):
+            return None
+
         # Compare image size ourselves since the Matplotlib
         # exception is a bit cryptic in this case and doesn't show
         # the filenames
-        expected_shape = imread(str(baseline_image)).shape[:2]
-        actual_shape = imread(str(test_image)).shape[:2]
+        expected_shape = _image_shape(baseline_image)
+        actual_shape = _image_shape(test_image)
         if expected_shape != actual_shape:
             return SHAPE_MISMATCH_ERROR.format(expected_path=baseline_image,
                                                expected_shape=expected_shape,
@@ -462,8 +488,11 @@ class ImageComparison:
         return compare_images(str(baseline_image), str(test_image), tol=tolerance)
 
     def load_hash_library(self, library_path):
-        with open(str(library_path)) as fp:
-            return json.load(fp)
+        library_path = str(library_path)
+        if library_path not in self._hash_libraries:
+            with open(library_path) as fp:
+                self._hash_libraries[library_path] = json.load(fp)
+        return self._hash_libraries[library_path]
 
     def compare_image_to_hash_library(self, item, fig, result_dir):
         new_test = False
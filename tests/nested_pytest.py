@@ -0,0 +1,20 @@
+"""
+Worker used by test_pytest_mpl to run pytest in a forked process.
+
+Each worker imports this module by name to find its target, so it must not
+have side effects or heavy imports at import time.
+"""
+import io
+import contextlib
+
+import pytest
+
+
+def run(args, conn):
+    """
+    Run pytest with the given arguments and send back the exit code and stdout.
+    """
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        code = pytest.main(args)
+    conn.send((int(code), stdout.getvalue()))
+    conn.close()
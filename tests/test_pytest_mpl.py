@@ -1,37 +1,119 @@
 import os
 import sys
 import json
+import mmap
+import atexit
+import functools
+import threading
+import py_compile
 import subprocess
+import multiprocessing
+from typing import NamedTuple
 from pathlib import Path
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from concurrent.futures import ThreadPoolExecutor
 
 import matplotlib
 import matplotlib.ft2font
-import matplotlib.pyplot as plt
 import pytest
 from packaging.version import Version
 
-MPL_VERSION = Version(matplotlib.__version__)
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Env(NamedTuple):
+    """
+    Matplotlib and freetype dependent settings used by the tests.
+    """
+    mpl_version: Version
+    ftv: str
+    hash_filename: str
+    baseline_dir_local: str
+    baseline_dir_abs: str
+    hash_baseline_dir_abs: str
+    hash_library: str
+
+
+@functools.lru_cache(maxsize=1)
+def get_env():
+    """
+    Work out the test settings for the installed matplotlib and freetype.
+
+    This is only done once per process, however many times it is called.
+    """
+    mpl_version = Version(matplotlib.__version__)
+
+    baseline_dir = 'baseline'
+
+    if mpl_version >= Version('2'):
+        baseline_subdir = '2.0.x'
+
+    baseline_dir_local = os.path.join(baseline_dir, baseline_subdir)
+
+    ftv = matplotlib.ft2font.__freetype_version__.replace('.', '')
+    hash_filename = f"mpl{mpl_version.major}{mpl_version.minor}_ft{ftv}.json"
+
+    if "+" in matplotlib.__version__:
+        hash_filename = "mpldev.json"
 
-baseline_dir = 'baseline'
+    hash_library = os.path.join(_HERE, 'baseline', 'hashes', hash_filename)
 
-if MPL_VERSION >= Version('2'):
-    baseline_subdir = '2.0.x'
+    baseline_dir_abs = os.path.join(_HERE, 'baseline', baseline_subdir)
+    hash_baseline_dir_abs = os.path.join(_HERE, 'baseline', 'hybrid')
 
-baseline_dir_local = os.path.join(baseline_dir, baseline_subdir)
-baseline_dir_remote = 'http://matplotlib.github.io/pytest-mpl/' + baseline_subdir + '/'
+    return Env(mpl_version=mpl_version,
+               ftv=ftv,
+               hash_filename=hash_filename,
+               baseline_dir_local=baseline_dir_local,
+               baseline_dir_abs=baseline_dir_abs,
+               hash_baseline_dir_abs=hash_baseline_dir_abs,
+               hash_library=hash_library)
 
-ftv = matplotlib.ft2font.__freetype_version__.replace('.', '')
-hash_filename = f"mpl{MPL_VERSION.major}{MPL_VERSION.minor}_ft{ftv}.json"
 
-if "+" in matplotlib.__version__:
-    hash_filename = "mpldev.json"
+_ENV = get_env()
+MPL_VERSION = _ENV.mpl_version
+ftv = _ENV.ftv
+hash_filename = _ENV.hash_filename
+baseline_dir_local = _ENV.baseline_dir_local
+baseline_dir_abs = _ENV.baseline_dir_abs
+hash_baseline_dir_abs = _ENV.hash_baseline_dir_abs
+hash_library = _ENV.hash_library
 
-hash_library = (Path(__file__).parent / "baseline" /  # noqa
-                "hashes" / hash_filename)
+fail_hash_library = os.path.join(_HERE, 'baseline', 'test_hash_lib.json')
 
-fail_hash_library = Path(__file__).parent / "baseline" / "test_hash_lib.json"
-baseline_dir_abs = Path(__file__).parent / "baseline" / baseline_subdir
-hash_baseline_dir_abs = Path(__file__).parent / "baseline" / "hybrid"
+
+class _BaselineRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serve the local baseline images, standing in for the remote mirror.
+    """
+
+    # SimpleHTTPRequestHandler only accepts a directory from Python 3.7
+    def translate_path(self, path):
+        path = super().translate_path(path)
+        return os.path.join(baseline_dir_abs, os.path.relpath(path, os.getcwd()))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+# The remote baseline tests download from this loopback server rather than
+# from matplotlib.github.io, so that they do not depend on the network. The
+# socket is bound here since the URL is needed by the test decorators, and
+# the server is run by the _local_baseline_server fixture. The socket is also
+# closed at exit for sessions where that fixture never runs (e.g.
+# --collect-only or when no tests are selected).
+_BASELINE_SERVER = _ThreadingHTTPServer(('127.0.0.1', 0), _BaselineRequestHandler)
+atexit.register(_BASELINE_SERVER.server_close)
+baseline_dir_remote = f'http://127.0.0.1:{_BASELINE_SERVER.server_address[1]}/'
+
+# Evaluate the conditions used to skip tests once, when the module is imported
+_HASH_LIB_PRESENT = os.path.exists(hash_library)
+_FT_OK = ftv == '261'
 
 
 WIN = sys.platform.startswith('win')
@@ -40,47 +122,189 @@ WIN = sys.platform.startswith('win')
 DEFAULT_TOLERANCE = 10 if WIN else 2
 
 
+# Running pytest in a fresh interpreter for every call re-imports matplotlib
+# each time, so on platforms that support it we instead fork each run from a
+# server process which has already imported the heavy dependencies.
+if WIN:
+    _FORKSERVER = None
+else:
+    _FORKSERVER = multiprocessing.get_context('forkserver')
+    _FORKSERVER.set_forkserver_preload(['matplotlib', 'matplotlib.pyplot', 'numpy', 'pytest'])
+
+
+# The workers import their target by name, so keep it in a module without
+# import-time side effects and make sure they can find it whatever import mode
+# pytest used for this module.
+if _HERE not in sys.path:
+    sys.path.append(_HERE)
+
+import nested_pytest  # noqa: E402
+
+
+def start_pytest(args):
+    """
+    Start pytest with the given arguments without waiting for it to finish.
+
+    The returned handle should be passed to wait_pytest.
+    """
+    # The generated test files contain no asserts to rewrite, and disabling the
+    # rewrite lets them load from the bytecode compiled by generated_test_files.
+    # The cache provider is disabled since runs on the same file can overlap.
+    args = ['-s', '-p', 'no:cacheprovider', '--assert=plain'] + args
+
+    if _FORKSERVER is None:
+        # universal_newlines rather than text=True, which needs Python 3.7
+        return subprocess.Popen([sys.executable, '-m', 'pytest'] + args,
+                                stdout=subprocess.PIPE, universal_newlines=True,
+                                errors='replace')
+
+    recv_conn, send_conn = _FORKSERVER.Pipe(duplex=False)
+    process = _FORKSERVER.Process(target=nested_pytest.run, args=(args, send_conn))
+    process.start()
+    send_conn.close()
+    return process, recv_conn
+
+
+def wait_pytest(handle):
+    """
+    Wait for a run started by start_pytest, returning the exit code and stdout.
+    """
+    if isinstance(handle, subprocess.Popen):
+        output, _ = handle.communicate()
+        return handle.returncode, output
+
+    process, recv_conn = handle
+    try:
+        code, output = recv_conn.recv()
+    except EOFError:
+        # The worker died without running pytest, so there is no result to
+        # report, and its exit code must not be mistaken for pytest's.
+        process.join()
+        raise RuntimeError(f'pytest worker exited with code {process.exitcode} '
+                           'before reporting a result')
+    finally:
+        recv_conn.close()
+    process.join()
+    return code, output
+
+
+def run_pytest(args):
+    """
+    Run pytest with the given arguments, returning the exit code and stdout.
+    """
+    return wait_pytest(start_pytest(args))
+
+
 def call_pytest(args):
-    return subprocess.call([sys.executable, '-m', 'pytest', '-s'] + args)
+    code, output = run_pytest(args)
+    print(output)
+    return code
 
 
 def assert_pytest_fails_with(args, output_substring):
-    try:
-        subprocess.check_output([sys.executable, '-m', 'pytest', '-s'] + args)
-    except subprocess.CalledProcessError as exc:
-        output = exc.output.decode()
-        assert output_substring in output, output
-        return output
-    else:
+    return assert_pytest_failed(args, run_pytest(args), output_substring)
+
+
+def assert_pytest_failed(args, result, output_substring):
+    code, output = result
+    if code == 0:
         raise RuntimeError(f'pytest did not fail with args {args}')
+    assert output_substring in output, output
+    return output
+
+
+def _fresh_fig():
+    """
+    Create a figure with a single axes without going through pyplot.
+    """
+    # Imported here rather than at the top of the module, since these take
+    # longer to import than the rest of matplotlib and are not needed to
+    # collect the tests.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    return fig, ax
+
+
+def run_many(calls):
+    """
+    Run independent pytest calls concurrently, returning their results in order.
+
+    Each pytest call spends most of its time in a separate process, so running
+    them from a thread pool overlaps their startup and execution.
+    """
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [executor.submit(call) for call in calls]
+        return [future.result() for future in futures]
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _local_baseline_server():
+    thread = threading.Thread(target=_BASELINE_SERVER.serve_forever, daemon=True)
+    try:
+        thread.start()
+        yield
+    finally:
+        # shutdown() waits for serve_forever, so only call it if that is running
+        if thread.is_alive():
+            _BASELINE_SERVER.shutdown()
+        _BASELINE_SERVER.server_close()
+
+
+@pytest.fixture(scope='session')
+def generated_test_files(tmp_path_factory):
+    """
+    Write each of the TEST_* templates below to its own test.py once per session.
+
+    The files are shared by the tests that run pytest on them, and are compiled
+    to bytecode up front so that none of the runs need to parse them.
+    """
+    templates = {
+        'FAILING': TEST_FAILING,
+        'OUTPUT_DIR': TEST_OUTPUT_DIR,
+        'GENERATE': TEST_GENERATE,
+        'SHAPE_MISMATCH': TEST_SHAPE_MISMATCH,
+        'FAILING_HASH': TEST_FAILING_HASH,
+        'FAILING_HYBRID': TEST_FAILING_HYBRID,
+        'FAILING_NEW_HASH': TEST_FAILING_NEW_HASH,
+        'MISSING_HASH': TEST_MISSING_HASH,
+        'RESULTS_ALWAYS': TEST_RESULTS_ALWAYS,
+    }
+    test_files = {}
+    for name, source in templates.items():
+        test_file = tmp_path_factory.mktemp(name.lower()) / 'test.py'
+        test_file.write_text(source)
+        py_compile.compile(os.fspath(test_file), doraise=True)
+        test_files[name] = test_file
+    return test_files
 
 
 @pytest.mark.mpl_image_compare(baseline_dir=baseline_dir_local,
                                tolerance=DEFAULT_TOLERANCE)
 def test_succeeds():
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    fig, ax = _fresh_fig()
     ax.plot([1, 2, 3])
     return fig
 
 
 @pytest.mark.mpl_image_compare(baseline_dir=baseline_dir_remote,
+                               filename='test_succeeds.png',
                                tolerance=DEFAULT_TOLERANCE)
 def test_succeeds_remote():
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    fig, ax = _fresh_fig()
     ax.plot([1, 2, 3])
     return fig
 
 
 # The following tries an invalid URL first (or at least a URL where the baseline
 # image won't exist), but should succeed with the second mirror.
-@pytest.mark.mpl_image_compare(baseline_dir='http://www.python.org,' + baseline_dir_remote,
-                               filename='test_succeeds_remote.png',
+@pytest.mark.mpl_image_compare(baseline_dir=baseline_dir_remote + 'missing/,' + baseline_dir_remote,
+                               filename='test_succeeds.png',
                                tolerance=DEFAULT_TOLERANCE)
 def test_succeeds_faulty_mirror():
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    fig, ax = _fresh_fig()
     ax.plot([1, 2, 3])
     return fig
 
@@ -90,8 +314,7 @@ class TestClass(object):
     @pytest.mark.mpl_image_compare(baseline_dir=baseline_dir_local,
                                    tolerance=DEFAULT_TOLERANCE)
     def test_succeeds(self):
-        fig = plt.figure()
-        ax = fig.add_subplot(1, 1, 1)
+        fig, ax = _fresh_fig()
         ax.plot([1, 2, 3])
         return fig
 
@@ -100,8 +323,7 @@ class TestClass(object):
                                savefig_kwargs={'dpi': 30},
                                tolerance=DEFAULT_TOLERANCE)
 def test_dpi():
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    fig, ax = _fresh_fig()
     ax.plot([1, 2, 3])
     return fig
 
@@ -118,19 +340,20 @@ def test_fail():
 """
 
 
-def test_fails(tmpdir):
+def test_fails(generated_test_files):
+
+    test_file = os.fspath(generated_test_files['FAILING'])
 
-    test_file = tmpdir.join('test.py').strpath
-    with open(test_file, 'w') as f:
-        f.write(TEST_FAILING)
+    code_mpl, code_no_mpl = run_many([
+        functools.partial(call_pytest, ['--mpl', test_file]),
+        functools.partial(call_pytest, [test_file]),
+    ])
 
     # If we use --mpl, it should detect that the figure is wrong
-    code = call_pytest(['--mpl', test_file])
-    assert code != 0
+    assert code_mpl != 0
 
     # If we don't use --mpl option, the test should succeed
-    code = call_pytest([test_file])
-    assert code == 0
+    assert code_no_mpl == 0
 
 
 TEST_OUTPUT_DIR = """
@@ -145,12 +368,10 @@ def test_output_dir():
 """
 
 
-def test_output_dir(tmpdir):
-    test_file = tmpdir.join('test.py').strpath
-    with open(test_file, 'w') as f:
-        f.write(TEST_OUTPUT_DIR)
+def test_output_dir(tmp_path, generated_test_files):
+    test_file = os.fspath(generated_test_files['OUTPUT_DIR'])
 
-    output_dir = tmpdir.join('test_output_dir')
+    output_dir = tmp_path / 'test_output_dir'
 
     # When we run the test, we should get output images where we specify
     code = call_pytest([f'--mpl-results-path={output_dir}',
@@ -173,27 +394,29 @@ def test_gen():
 """
 
 
-def test_generate(tmpdir):
+def test_generate(tmp_path, generated_test_files):
 
-    test_file = tmpdir.join('test.py').strpath
-    with open(test_file, 'w') as f:
-        f.write(TEST_GENERATE)
+    test_file = os.fspath(generated_test_files['GENERATE'])
 
-    gen_dir = tmpdir.mkdir('spam').mkdir('egg').strpath
+    gen_dir = tmp_path / 'spam' / 'egg'
+    gen_dir.mkdir(parents=True)
+    hash_file = gen_dir / 'test_hashes.json'
 
-    # If we don't generate, the test will fail
-    assert_pytest_fails_with(['--mpl', test_file], 'Image file not found for comparison test')
+    _, code_gen, code_gen_hash = run_many([
+        # If we don't generate, the test will fail
+        functools.partial(assert_pytest_fails_with, ['--mpl', test_file],
+                          'Image file not found for comparison test'),
+        functools.partial(call_pytest, [f'--mpl-generate-path={gen_dir}', test_file]),
+        functools.partial(call_pytest, [f'--mpl-generate-hash-library={hash_file}', test_file]),
+    ])
 
     # If we do generate, the test should succeed and a new file will appear
-    code = call_pytest([f'--mpl-generate-path={gen_dir}', test_file])
-    assert code == 0
-    assert os.path.exists(os.path.join(gen_dir, 'test_gen.png'))
+    assert code_gen == 0
+    assert (gen_dir / 'test_gen.png').exists()
 
     # If we do generate hash, the test will fail as no image is present
-    hash_file = os.path.join(gen_dir, 'test_hashes.json')
-    code = call_pytest([f'--mpl-generate-hash-library={hash_file}', test_file])
-    assert code == 1
-    assert os.path.exists(hash_file)
+    assert code_gen_hash == 1
+    assert hash_file.exists()
 
     with open(hash_file) as fp:
         hash_lib = json.load(fp)
@@ -201,10 +424,33 @@ def test_generate(tmpdir):
     assert "test.test_gen" in hash_lib
 
 
+TEST_SHAPE_MISMATCH = rf"""
+import pytest
+import matplotlib.pyplot as plt
+@pytest.mark.mpl_image_compare(baseline_dir=r"{baseline_dir_abs}",
+                               filename='test_succeeds.png')
+def test_shape_mismatch():
+    fig = plt.figure(figsize=(3, 2))
+    ax = fig.add_subplot(1,1,1)
+    ax.plot([1,2,3])
+    return fig
+"""
+
+
+def test_shape_mismatch(generated_test_files):
+
+    test_file = os.fspath(generated_test_files['SHAPE_MISMATCH'])
+
+    # The dimensions of the baseline are reported without a pixel comparison
+    output = assert_pytest_fails_with(['--mpl', test_file],
+                                      'Error: Image dimensions did not match.')
+    assert 'Expected shape: (600, 800)' in output, output
+    assert 'Actual shape: (200, 300)' in output, output
+
+
 @pytest.mark.mpl_image_compare(baseline_dir=baseline_dir_local, tolerance=20)
 def test_tolerance():
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    fig, ax = _fresh_fig()
     ax.plot([1, 2, 2])
     return fig
 
@@ -217,8 +463,7 @@ def test_nofigure():
                                style='fivethirtyeight',
                                tolerance=DEFAULT_TOLERANCE)
 def test_base_style():
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    fig, ax = _fresh_fig()
     ax.plot([1, 2, 3])
     return fig
 
@@ -226,8 +471,7 @@ def test_base_style():
 @pytest.mark.mpl_image_compare(baseline_dir=baseline_dir_local,
                                remove_text=True)
 def test_remove_text():
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    fig, ax = _fresh_fig()
     ax.plot([1, 2, 3])
     return fig
 
@@ -236,8 +480,7 @@ def test_remove_text():
 @pytest.mark.mpl_image_compare(baseline_dir=baseline_dir_local,
                                remove_text=True)
 def test_parametrized(s):
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    fig, ax = _fresh_fig()
     ax.scatter([1, 3, 4, 3, 2], [1, 4, 3, 3, 1], s=s)
     return fig
 
@@ -253,19 +496,17 @@ class TestClassWithSetup:
                                    filename='test_succeeds.png',
                                    tolerance=DEFAULT_TOLERANCE)
     def test_succeeds(self):
-        fig = plt.figure()
-        ax = fig.add_subplot(1, 1, 1)
+        fig, ax = _fresh_fig()
         ax.plot(self.x)
         return fig
 
 
 # hashlib
 
-@pytest.mark.skipif(not hash_library.exists(), reason="No hash library for this mpl version")
+@pytest.mark.skipif(not _HASH_LIB_PRESENT, reason="No hash library for this mpl version")
 @pytest.mark.mpl_image_compare(hash_library=hash_library)
 def test_hash_succeeds():
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    fig, ax = _fresh_fig()
     ax.plot([1, 2, 3])
     return fig
 
@@ -282,28 +523,30 @@ def test_hash_fails():
 """
 
 
-def test_hash_fails(tmpdir):
+def test_hash_fails(generated_test_files):
 
-    test_file = tmpdir.join('test.py').strpath
-    with open(test_file, 'w', encoding='ascii') as f:
-        f.write(TEST_FAILING_HASH)
+    test_file = os.fspath(generated_test_files['FAILING_HASH'])
+
+    output, output_summary, code = run_many([
+        # If we use --mpl, it should detect that the figure is wrong
+        functools.partial(assert_pytest_fails_with, ['--mpl', test_file],
+                          "doesn't match hash FAIL in library"),
+        functools.partial(assert_pytest_fails_with,
+                          ['--mpl', test_file, '--mpl-generate-summary=html'],
+                          "doesn't match hash FAIL in library"),
+        functools.partial(call_pytest, [test_file]),
+    ])
 
-    # If we use --mpl, it should detect that the figure is wrong
-    output = assert_pytest_fails_with(['--mpl', test_file], "doesn't match hash FAIL in library")
     # We didn't specify a baseline dir so we shouldn't attempt to find one
     assert "Unable to find baseline image" not in output, output
 
     # Check that the summary path is printed and that it exists.
-    output = assert_pytest_fails_with(['--mpl', test_file, '--mpl-generate-summary=html'],
-                                      "doesn't match hash FAIL in library")
-    # We didn't specify a baseline dir so we shouldn't attempt to find one
     print_message = "A summary of the failed tests can be found at:"
-    assert print_message in output, output
-    printed_path = Path(output.split(print_message)[1].strip())
+    assert print_message in output_summary, output_summary
+    printed_path = Path(output_summary.split(print_message)[1].strip())
     assert printed_path.exists()
 
     # If we don't use --mpl option, the test should succeed
-    code = call_pytest([test_file])
     assert code == 0
 
 
@@ -320,33 +563,39 @@ def test_hash_fail_hybrid():
 """
 
 
-@pytest.mark.skipif(ftv != '261', reason="Incorrect freetype version for hash check")
-def test_hash_fail_hybrid(tmpdir):
+@pytest.mark.skipif(not _FT_OK, reason="Incorrect freetype version for hash check")
+def test_hash_fail_hybrid(generated_test_files):
 
-    test_file = tmpdir.join('test.py').strpath
-    with open(test_file, 'w', encoding='ascii') as f:
-        f.write(TEST_FAILING_HYBRID)
+    test_file = os.fspath(generated_test_files['FAILING_HYBRID'])
+    fail_dir = os.path.join(hash_baseline_dir_abs, 'fail')
+    succeed_dir = os.path.join(hash_baseline_dir_abs, 'succeed')
+
+    fail_args = ['--mpl', test_file, rf'--mpl-baseline-path={fail_dir}']
+    missing_args = ['--mpl', test_file, '--mpl-baseline-path=/not/a/path']
+    succeed_args = ['--mpl', test_file, rf'--mpl-baseline-path={succeed_dir}']
+
+    # Start every run before waiting on any of them, so that they overlap
+    runs = [start_pytest(args) for args in [fail_args, missing_args, succeed_args, [test_file]]]
+    result_fail, result_missing, result_succeed, (code, _) = [wait_pytest(run) for run in runs]
+
+    output_fail = assert_pytest_failed(fail_args, result_fail,
+                                       "doesn't match hash FAIL in library")
+    output_missing = assert_pytest_failed(missing_args, result_missing,
+                                          "doesn't match hash FAIL in library")
+    output_succeed = assert_pytest_failed(succeed_args, result_succeed,
+                                          "doesn't match hash FAIL in library")
 
     # Assert that image comparison runs and fails
-    output = assert_pytest_fails_with(['--mpl', test_file,
-                                       rf'--mpl-baseline-path={hash_baseline_dir_abs / "fail"}'],
-                                      "doesn't match hash FAIL in library")
-    assert "Error: Image files did not match." in output, output
+    assert "Error: Image files did not match." in output_fail, output_fail
 
     # Assert reports missing baseline image
-    output = assert_pytest_fails_with(['--mpl', test_file,
-                                       '--mpl-baseline-path=/not/a/path'],
-                                      "doesn't match hash FAIL in library")
-    assert "Unable to find baseline image" in output, output
+    assert "Unable to find baseline image" in output_missing, output_missing
 
     # Assert reports image comparison succeeds
-    output = assert_pytest_fails_with(['--mpl', test_file,
-                                       rf'--mpl-baseline-path={hash_baseline_dir_abs / "succeed"}'],
-                                      "doesn't match hash FAIL in library")
-    assert "However, the comparison to the baseline image succeeded." in output, output
+    assert ("However, the comparison to the baseline image succeeded." in
+            output_succeed), output_succeed
 
     # If we don't use --mpl option, the test should succeed
-    code = call_pytest([test_file])
     assert code == 0
 
 
@@ -362,24 +611,25 @@ def test_hash_fails():
 """
 
 
-@pytest.mark.skipif(ftv != '261', reason="Incorrect freetype version for hash check")
-def test_hash_fail_new_hashes(tmpdir):
+@pytest.mark.skipif(not _FT_OK, reason="Incorrect freetype version for hash check")
+def test_hash_fail_new_hashes(tmp_path, generated_test_files):
     # Check that the hash comparison fails even if a new hash file is requested
-    test_file = tmpdir.join('test.py').strpath
-    with open(test_file, 'w', encoding='ascii') as f:
-        f.write(TEST_FAILING_NEW_HASH)
+    test_file = os.fspath(generated_test_files['FAILING_NEW_HASH'])
 
-    # Assert that image comparison runs and fails
-    assert_pytest_fails_with(['--mpl', test_file,
-                              f'--mpl-hash-library={fail_hash_library}'],
-                             "doesn't match hash FAIL in library")
+    hash_file = tmp_path / 'new_hashes.json'
 
-    hash_file = tmpdir.join('new_hashes.json').strpath
     # Assert that image comparison runs and fails
-    assert_pytest_fails_with(['--mpl', test_file,
-                              f'--mpl-hash-library={fail_hash_library}',
-                              f'--mpl-generate-hash-library={hash_file}'],
-                             "doesn't match hash FAIL")
+    run_many([
+        functools.partial(assert_pytest_fails_with,
+                          ['--mpl', test_file,
+                           f'--mpl-hash-library={fail_hash_library}'],
+                          "doesn't match hash FAIL in library"),
+        functools.partial(assert_pytest_fails_with,
+                          ['--mpl', test_file,
+                           f'--mpl-hash-library={fail_hash_library}',
+                           f'--mpl-generate-hash-library={hash_file}'],
+                          "doesn't match hash FAIL"),
+    ])
 
 
 TEST_MISSING_HASH = """
@@ -394,22 +644,23 @@ def test_hash_missing():
 """
 
 
-def test_hash_missing(tmpdir):
-
-    test_file = tmpdir.join('test.py').strpath
-    with open(test_file, 'w') as f:
-        f.write(TEST_MISSING_HASH)
+def test_hash_missing(generated_test_files):
 
-    # Assert fails if hash library missing
-    assert_pytest_fails_with(['--mpl', test_file, '--mpl-hash-library=/not/a/path'],
-                             "Can't find hash library at path")
+    test_file = os.fspath(generated_test_files['MISSING_HASH'])
 
-    # Assert fails if hash not in library
-    assert_pytest_fails_with(['--mpl', test_file, f'--mpl-hash-library={fail_hash_library}'],
-                             "Hash for test 'test.test_hash_missing' not found in")
+    _, _, code = run_many([
+        # Assert fails if hash library missing
+        functools.partial(assert_pytest_fails_with,
+                          ['--mpl', test_file, '--mpl-hash-library=/not/a/path'],
+                          "Can't find hash library at path"),
+        # Assert fails if hash not in library
+        functools.partial(assert_pytest_fails_with,
+                          ['--mpl', test_file, f'--mpl-hash-library={fail_hash_library}'],
+                          "Hash for test 'test.test_hash_missing' not found in"),
+        functools.partial(call_pytest, [test_file]),
+    ])
 
     # If we don't use --mpl option, the test should succeed
-    code = call_pytest([test_file])
     assert code == 0
 
 
@@ -430,42 +681,50 @@ def test_unmodified(): return plot()
 """
 
 
-@pytest.mark.skipif(not hash_library.exists(), reason="No hash library for this mpl version")
-def test_results_always(tmpdir):
+@pytest.mark.skipif(not _HASH_LIB_PRESENT, reason="No hash library for this mpl version")
+def test_results_always(tmp_path, generated_test_files):
 
-    test_file = tmpdir.join('test.py').strpath
-    with open(test_file, 'w') as f:
-        f.write(TEST_RESULTS_ALWAYS)
-    results_path = tmpdir.mkdir('results')
+    test_file = os.fspath(generated_test_files['RESULTS_ALWAYS'])
+    results_path = tmp_path / 'results'
+    results_path.mkdir()
 
     code = call_pytest(['--mpl', test_file, '--mpl-results-always',
                         rf'--mpl-hash-library={hash_library}',
                         rf'--mpl-baseline-path={baseline_dir_abs}',
                         '--mpl-generate-summary=html',
-                        rf'--mpl-results-path={results_path.strpath}'])
+                        rf'--mpl-results-path={results_path}'])
     assert code == 0  # hashes correct, so all should pass
 
-    comparison_file = results_path.join('fig_comparison.html')
-    with open(comparison_file, 'r') as f:
-        html = f.read()
-
-    # each test, and which images should exist
-    for test, exists in [
-        ('test_modified', ['baseline', 'result-failed-diff', 'result']),
-        ('test_new', ['result']),
-        ('test_unmodified', ['baseline', 'result']),
-    ]:
-
-        test_name = f'test.{test}'
-
-        summary = f'{test_name} (passed)'
-        assert summary in html
-
-        for image_type in ['baseline', 'result-failed-diff', 'result']:
-            image = f'{test_name}/{image_type}.png'
-            assert image in html  # <img> is present even if 404
-            image_exists = results_path.join(*image.split('/')).exists()
-            if image_type in exists:  # assert image so pytest prints it on error
-                assert image and image_exists
-            else:
-                assert image and not image_exists
+    comparison_file = results_path / 'fig_comparison.html'
+    image_types = ['baseline', 'result-failed-diff', 'result']
+
+    # List each test's results directory once instead of checking every image
+    existing = {test_dir.name: {entry.name for entry in os.scandir(test_dir.path)}
+                for test_dir in os.scandir(results_path) if test_dir.is_dir()}
+
+    # Search the summary in place rather than reading and decoding it, all
+    # the strings we look for are ASCII
+    with open(comparison_file, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as html:
+
+        # each test, and which images should exist
+        for test, exists in [
+            ('test_modified', ['baseline', 'result-failed-diff', 'result']),
+            ('test_new', ['result']),
+            ('test_unmodified', ['baseline', 'result']),
+        ]:
+
+            test_name = f'test.{test}'
+
+            summary = f'{test_name} (passed)'
+            assert html.find(summary.encode()) != -1, summary
+
+            images = [f'{test_name}/{image_type}.png' for image_type in image_types]
+            for image_type, image in zip(image_types, images):
+                # <img> is present even if 404
+                assert html.find(image.encode()) != -1, image
+                image_exists = f'{image_type}.png' in existing.get(test_name, set())
+                if image_type in exists:  # assert image so pytest prints it on error
+                    assert image and image_exists
+                else:
+                    assert image and not image_exists